@@ -24,12 +24,23 @@ def _(mo):
 
 @app.cell
 def _():
+    import numpy as np
     import xarray as xr
     from arraylake import Client
     from dask.diagnostics import ProgressBar
+    from flox.xarray import xarray_reduce
     import marimo as mo
 
-    from energy import CLIMATE_EPOCH, TEXAS_METROS, TEXAS_BBOX, calculate_heating_degree
+    xr.set_options(use_flox=True)
+
+    from energy import (
+        CLIMATE_EPOCH,
+        TEXAS_METROS,
+        TEXAS_BBOX,
+        cached_dataset,
+        calculate_heating_degree,
+        rolling_mean,
+    )
     from plot import plot_climatology
     return (
         CLIMATE_EPOCH,
@@ -37,9 +48,13 @@ def _():
         ProgressBar,
         TEXAS_BBOX,
         TEXAS_METROS,
+        cached_dataset,
         calculate_heating_degree,
         mo,
+        np,
         plot_climatology,
+        rolling_mean,
+        xarray_reduce,
         xr,
     )
 
@@ -72,16 +87,25 @@ def _(client):
 def _(repo, xr):
     session = repo.readonly_session("main")
 
-    era5 = xr.open_zarr(session.store, group="temporal", chunks={})
+    # Icechunk serves metadata directly, so skip the consolidated-metadata probe.
+    # Coarsen dask chunks along time (in multiples of the storage chunks) to keep
+    # the graph small.
+    era5 = xr.open_zarr(
+        session.store,
+        group="temporal",
+        consolidated=False,
+        chunks={"time": "auto"},
+    )
+    # only temperature is needed for heating degrees
+    era5 = era5[["t2"]]
     era5
     return (era5,)
 
 
 @app.cell
 def _(TEXAS_BBOX, era5):
-    texas_temp_hourly = (
-        era5["t2"].sel(**TEXAS_BBOX) - 273.15
-    )  # Convert from K to C
+    # Kept in Kelvin (single precision); the unit conversion is fused into the HD kernel
+    texas_temp_hourly = era5["t2"].sel(**TEXAS_BBOX).astype("float32")
 
     texas_temp_hourly
     return (texas_temp_hourly,)
@@ -109,7 +133,11 @@ def _(calculate_heating_degree, mo):
 
 @app.cell
 def _(calculate_heating_degree, texas_temp_hourly):
-    hdd = calculate_heating_degree(texas_temp_hourly, aggregation="daily")
+    hdd = calculate_heating_degree(
+        texas_temp_hourly, aggregation="daily", temperature_units="K"
+    )
+    # decode the calendar once and reuse it for grouping and plotting
+    hdd = hdd.assign_coords(dayofyear=hdd.time.dt.dayofyear)
     hdd
     return (hdd,)
 
@@ -133,11 +161,31 @@ def _(CLIMATE_EPOCH, mo):
 
 
 @app.cell
-def _(CLIMATE_EPOCH, ProgressBar, hdd):
-    with ProgressBar():
-        hdd_daily_temp = hdd.sel(time=CLIMATE_EPOCH).load()
-    hdd_climatology_mean = hdd_daily_temp.groupby("time.dayofyear").mean(dim="time")
-    hdd_climatology_std = hdd_daily_temp.groupby("time.dayofyear").std(dim="time")
+def _(CLIMATE_EPOCH, ProgressBar, cached_dataset, hdd, np, xarray_reduce, xr):
+    def _compute_climatology():
+        with ProgressBar():
+            hdd_daily_temp = hdd.sel(time=CLIMATE_EPOCH).load()
+
+        # flox computes each statistic with one vectorized grouped reduction over
+        # the in-memory array. Declaring the day-of-year groups up front fixes the
+        # output axis without first scanning the labels.
+        days_of_year = np.arange(1, 367)
+        return xr.Dataset(
+            {
+                stat: xarray_reduce(
+                    hdd_daily_temp, "dayofyear", func=stat, expected_groups=days_of_year
+                )
+                for stat in ("mean", "std")
+            }
+        )
+
+    # the climatology only depends on the epoch, so reuse it across runs
+    hdd_climatology = cached_dataset(
+        f"cache/hdd_climatology_{CLIMATE_EPOCH.start}_{CLIMATE_EPOCH.stop}.zarr",
+        _compute_climatology,
+    )
+    hdd_climatology_mean = hdd_climatology["mean"]
+    hdd_climatology_std = hdd_climatology["std"]
 
     hdd_climatology_mean
     return hdd_climatology_mean, hdd_climatology_std
@@ -157,6 +205,29 @@ def _(mo):
     return
 
 
+@app.cell(hide_code=True)
+def _(TEXAS_METROS, hdd, xr):
+    # Extract 2021 for every metro area with one vectorized nearest-neighbour
+    # selection, so the interactive cell below never touches dask or Zarr
+    metro_names = list(TEXAS_METROS)
+    metro_lats = xr.DataArray(
+        [m["latitude"] for m in TEXAS_METROS.values()],
+        dims="metro",
+        coords={"metro": metro_names},
+    )
+    metro_lons = xr.DataArray(
+        [m["longitude"] for m in TEXAS_METROS.values()],
+        dims="metro",
+        coords={"metro": metro_names},
+    )
+    actual_all = (
+        hdd.sel(latitude=metro_lats, longitude=metro_lons, method="nearest")
+        .sel(time=slice("2021-01-01", "2021-12-31"))
+        .load()
+    )
+    return (actual_all,)
+
+
 @app.cell
 def _(TEXAS_METROS, mo):
     dropdown_dict = mo.ui.dropdown(
@@ -170,11 +241,12 @@ def _(TEXAS_METROS, mo):
 
 @app.cell
 def _(
+    actual_all,
     dropdown_dict,
-    hdd,
     hdd_climatology_mean,
     hdd_climatology_std,
     mo,
+    rolling_mean,
     smooth_factor,
 ):
     # extract the lat/lon for the choosen location
@@ -183,28 +255,19 @@ def _(
 
 
     # Extract data for the choosen location
-    climate_mean = (
-        hdd_climatology_mean.sel(
-            latitude=lat, longitude=lon, method="nearest"
-        )
-        .rolling(dayofyear=smooth_factor.value)
-        .mean()
+    climate_mean = rolling_mean(
+        hdd_climatology_mean.sel(latitude=lat, longitude=lon, method="nearest"),
+        "dayofyear",
+        smooth_factor.value,
     )
-    climate_std = (
-        hdd_climatology_std.sel(
-            latitude=lat, longitude=lon, method="nearest"
-        )
-        .rolling(dayofyear=smooth_factor.value)
-        .mean()
+    climate_std = rolling_mean(
+        hdd_climatology_std.sel(latitude=lat, longitude=lon, method="nearest"),
+        "dayofyear",
+        smooth_factor.value,
     )
 
-    actual = (
-        hdd.sel(latitude=lat, longitude=lon, method="nearest")
-        .sel(time=slice("2021-01-01", "2021-12-31"))
-        .load()
-    )
-    actual.coords["dayofyear"] = actual["time.dayofyear"]
-    actual_smooth = actual.rolling(time=smooth_factor.value).mean()
+    actual = actual_all.sel(metro=dropdown_dict.selected_key)
+    actual_smooth = rolling_mean(actual, "time", smooth_factor.value)
 
     mo.vstack([dropdown_dict, smooth_factor])
     return actual_smooth, climate_mean, climate_std, lat, lon
@@ -242,7 +305,9 @@ def _(mo):
 
 @app.cell
 def _(calculate_heating_degree, lat, lon, texas_temp_hourly):
-    hd_hourly = calculate_heating_degree(texas_temp_hourly, aggregation="hourly")
+    hd_hourly = calculate_heating_degree(
+        texas_temp_hourly, aggregation="hourly", temperature_units="K"
+    )
 
     hd_hourly.sel(
         latitude=lat, longitude=lon, method="nearest"
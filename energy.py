@@ -1,3 +1,8 @@
+import shutil
+from collections.abc import Callable
+from functools import lru_cache
+from pathlib import Path
+
 import numpy as np
 import xarray as xr
 import zarr
@@ -38,8 +43,46 @@ TEXAS_BBOX = {"latitude": slice(37, 25), "longitude": slice(253, 267)}
 CLIMATE_EPOCH = slice("1990-01-01", "2020-12-31")
 
 
+def _is_midnight_aligned_hourly(da: xr.DataArray) -> bool:
+    """Check whether ``da`` is on a gap-free hourly grid of whole days from midnight."""
+    time = da["time"].values
+    if time.size == 0 or time.size % 24 != 0:
+        return False
+    if time[0] != time[0].astype("datetime64[D]"):
+        return False
+    return bool(np.all(np.diff(time) == np.timedelta64(1, "h")))
+
+
+def to_daily(da: xr.DataArray, reduction: str = "mean") -> xr.DataArray:
+    """
+    Reduce hourly data to daily values with the named reduction ("sum" or "mean").
+
+    Gap-free hourly data covering whole days from midnight is reduced as fixed
+    24-step blocks, which avoids resample's grouping overhead; anything else falls
+    back to ``resample(time="1D")``.
+    """
+    if reduction not in ("sum", "mean"):
+        raise ValueError(f"Invalid reduction: {reduction}. Must be 'sum' or 'mean'")
+
+    if _is_midnight_aligned_hourly(da):
+        coarsened = da.coarsen(time=24, coord_func={"time": "min"})
+        return coarsened.sum() if reduction == "sum" else coarsened.mean()
+    resampled = da.resample(time="1D")
+    return resampled.sum() if reduction == "sum" else resampled.mean()
+
+
+def _hourly_heating_degree(temperature: np.ndarray, base_temp: float) -> np.ndarray:
+    """Evaluate max(0, base_temp - temperature) with a single output allocation."""
+    hd: np.ndarray = np.subtract(base_temp, temperature)
+    np.maximum(hd, 0, out=hd)
+    return hd
+
+
 def calculate_heating_degree(
-    temperature_da: xr.DataArray, base_temp: float = 18.0, aggregation: str = "daily"
+    temperature_da: xr.DataArray,
+    base_temp: float = 18.0,
+    aggregation: str = "daily",
+    temperature_units: str = "C",
 ) -> xr.DataArray:
     """
     Calculate heating degree from hourly xarray temperature data.
@@ -50,11 +93,14 @@ def calculate_heating_degree(
     Parameters
     ----------
     temperature_da : xr.DataArray
-        Hourly temperature DataArray in Celsius
+        Hourly temperature DataArray in Celsius (or Kelvin, see temperature_units)
     base_temp : float, default=18
         Base temperature in Celsius for HDD calculation (typically 18°C)
     aggregation : str, default='daily'
         How to aggregate hourly HD ('daily', 'monthly', 'yearly', or 'hourly')
+    temperature_units : str, default='C'
+        Units of temperature_da ('C' or 'K'). Passing Kelvin directly folds the
+        unit conversion into the HD kernel instead of a separate pass.
 
     Returns
     -------
@@ -63,8 +109,26 @@ def calculate_heating_degree(
         Units are degree-hours for 'hourly', degree-hours/day for 'daily',
         degree-hours/month for 'monthly', degree-hours/year for 'yearly'
     """
+    # Express the base temperature in the units of the input
+    if temperature_units == "C":
+        base = base_temp
+    elif temperature_units == "K":
+        base = base_temp + 273.15
+    else:
+        raise ValueError(
+            f"Invalid temperature_units: {temperature_units}. Must be 'C' or 'K'"
+        )
+
     # Calculate hourly HDD: max(0, base_temp - temperature)
-    hourly_hd = xr.where(temperature_da < base_temp, base_temp - temperature_da, 0)
+    # A single kernel keeps this to one dask task per chunk
+    # Match the base temperature to the input dtype so float32 data stays float32
+    hourly_hd = xr.apply_ufunc(
+        _hourly_heating_degree,
+        temperature_da,
+        kwargs={"base_temp": temperature_da.dtype.type(base)},
+        dask="parallelized",
+        output_dtypes=[temperature_da.dtype],
+    )
 
     # Set base attributes
     hourly_hd.attrs = {
@@ -80,7 +144,7 @@ def calculate_heating_degree(
         return hourly_hd
     elif aggregation == "daily":
         # Sum hourly HDD to get daily total degree-hours
-        hd = hourly_hd.resample(time="1D").sum()
+        hd = to_daily(hourly_hd, "sum")
         hd.attrs.update(
             {
                 "units": "degree-hours/day",
@@ -116,6 +180,131 @@ def calculate_heating_degree(
     return hd
 
 
+def _solar_power(
+    ssrd: np.ndarray,
+    t2: np.ndarray,
+    capacity: np.ndarray | float,
+    efficiency: np.ndarray | float,
+    temp_coeff: np.ndarray | float,
+) -> np.ndarray:
+    """Evaluate the solar production model in a single pass over each chunk."""
+    # ssrd is accumulated over the hour, so divide by 3600 seconds to get W/m²,
+    # then normalise by the 1000 W/m² rated irradiance
+    production = ssrd / (3600 * 1000)
+
+    # Temperature correction (reference temperature is 25°C = 298.15K)
+    temp_correction = 1 + temp_coeff * (t2 - 298.15)
+    production = production * temp_correction * (capacity * efficiency)
+
+    # Clip negative values
+    return np.maximum(production, 0, out=production)
+
+
+def rolling_mean(da: xr.DataArray, dim: str, window: int) -> xr.DataArray:
+    """
+    Calculate a trailing moving mean of an in-memory DataArray along one dimension.
+
+    Equivalent to ``da.rolling({dim: window}).mean()`` (the first ``window - 1``
+    values are NaN) but computed directly on the NumPy values, which avoids the
+    rolling-object overhead for short 1D series that are re-smoothed interactively.
+    """
+
+    def _trailing_mean(values: np.ndarray) -> np.ndarray:
+        dtype = values.dtype if np.issubdtype(values.dtype, np.floating) else np.float64
+        out = np.full(values.shape, np.nan, dtype=dtype)
+        # like rolling, a window longer than the series leaves it all NaN
+        if window <= values.shape[-1]:
+            windows = np.lib.stride_tricks.sliding_window_view(values, window, axis=-1)
+            out[..., window - 1 :] = windows.mean(axis=-1)
+        return out
+
+    smoothed: xr.DataArray = xr.apply_ufunc(
+        _trailing_mean, da, input_core_dims=[[dim]], output_core_dims=[[dim]]
+    )
+    # apply_ufunc moves the core dim last, so restore the input's dim order
+    return smoothed.transpose(*da.dims)
+
+
+def _nearest_index(coord: np.ndarray, values: xr.DataArray) -> xr.DataArray:
+    """Positions in a sorted 1D coordinate closest to each of ``values``."""
+    if coord.size == 1:
+        pos = np.zeros(values.shape, dtype=np.intp)
+        return xr.DataArray(pos, dims=values.dims, coords=values.coords)
+
+    steps = np.diff(coord)
+    if steps.size and np.allclose(steps, steps[0]):
+        # Regular grid (e.g. ERA5's 0.25°): the nearest cell is a direct formula
+        pos = np.rint((values.values - coord[0]) / steps[0]).astype(np.intp)
+        pos = np.clip(pos, 0, coord.size - 1)
+        return xr.DataArray(pos, dims=values.dims, coords=values.coords)
+
+    descending = coord[0] > coord[-1]
+    ascending = coord[::-1] if descending else coord
+    points = values.values
+
+    pos = np.clip(np.searchsorted(ascending, points), 1, ascending.size - 1)
+    # step back to the left neighbour when it is at least as close
+    pos -= points - ascending[pos - 1] <= ascending[pos] - points
+    if descending:
+        pos = coord.size - 1 - pos
+
+    return xr.DataArray(pos, dims=values.dims, coords=values.coords)
+
+
+def nearest_grid_indexers(
+    grid: xr.Dataset | xr.DataArray, latitude: xr.DataArray, longitude: xr.DataArray
+) -> dict[str, xr.DataArray]:
+    """
+    Build ``isel`` indexers for the grid cells nearest to a set of points.
+
+    Equivalent to ``grid.sel(latitude=..., longitude=..., method="nearest")`` but
+    resolved once (arithmetically on regular grids, otherwise with a binary
+    search), so the result can be reused across variables. Longitudes in
+    [-180, 180) are wrapped onto a [0, 360) grid. Non-finite points raise a
+    ValueError rather than snapping to an arbitrary cell.
+    """
+    for name, points in (("latitude", latitude), ("longitude", longitude)):
+        if not np.all(np.isfinite(points.values)):
+            raise ValueError(f"Invalid {name}: all points must be finite")
+
+    grid_lon = grid["longitude"].values
+    if grid_lon.min() >= 0:
+        longitude = longitude % 360
+
+    return {
+        "latitude": _nearest_index(grid["latitude"].values, latitude),
+        "longitude": _nearest_index(grid_lon, longitude),
+    }
+
+
+def cached_dataset(path: str | Path, compute: Callable[[], xr.Dataset]) -> xr.Dataset:
+    """
+    Load a small derived Dataset from a local Zarr store, computing it on first use.
+
+    ``compute`` is only called when ``path`` does not exist yet; its result is
+    written to a temporary store and moved into place once complete, so an
+    interrupted write is never mistaken for a cached result. Loaded stores are
+    also kept in memory (keyed on the store's modification time) so re-running a
+    notebook cell does not touch disk again. Delete the store to force a recompute
+    after changing its inputs.
+    """
+    path = Path(path)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+        compute().to_zarr(tmp_path, mode="w")
+        tmp_path.rename(path)
+    return _load_zarr(path, path.stat().st_mtime_ns)
+
+
+@lru_cache(maxsize=8)
+def _load_zarr(path: Path, mtime_ns: int) -> xr.Dataset:
+    ds: xr.Dataset = xr.open_zarr(path)
+    return ds.load()
+
+
 def calculate_solar_production(
     ssrd: xr.DataArray,
     t2: xr.DataArray,
@@ -136,26 +325,65 @@ def calculate_solar_production(
     Returns:
     - Solar power production in MW
     """
-    # Convert cumulative radiation to average power (W/m²)
-    # ssrd is accumulated over the hour, so divide by 3600 seconds
-    irradiance = ssrd / 3600  # W/m²
-
-    # Temperature correction (reference temperature is 25°C = 298.15K)
-    temp_celsius = t2 - 273.15
-    temp_correction = 1 + temp_coeff * (temp_celsius - 25)
-
-    # Calculate production (assuming 1000 W/m² is the rated irradiance)
-    production = (
-        panel_capacity_mw * (irradiance / 1000) * efficiency_ref * temp_correction
+    return xr.apply_ufunc(
+        _solar_power,
+        ssrd,
+        t2,
+        panel_capacity_mw,
+        efficiency_ref,
+        temp_coeff,
+        dask="parallelized",
     )
 
-    # Clip negative values
-    return production.clip(min=0)
-
 
 def calculate_wind_speed(u: xr.DataArray, v: xr.DataArray) -> xr.DataArray:
     """Calculate wind speed from u and v components."""
-    return np.sqrt(u**2 + v**2)
+    return xr.apply_ufunc(np.hypot, u, v, dask="parallelized")
+
+
+def _wind_power_curve(
+    wind_speed: np.ndarray, capacity: np.ndarray | float
+) -> np.ndarray:
+    """Evaluate the piecewise wind power curve in a single pass."""
+    dtype = np.result_type(wind_speed, capacity)
+    wind_speed, capacity = np.broadcast_arrays(wind_speed, capacity)
+
+    # Rated power up to cut-out, zero above it
+    production = np.where(wind_speed < 25.0, capacity, 0).astype(dtype, copy=False)
+
+    # Cubic ramp below rated speed (zero below cut-in), evaluated only on the
+    # cells it applies to
+    ramp = wind_speed < 12.0
+    fraction = np.maximum(wind_speed[ramp] - 3.0, 0.0) / (12.0 - 3.0)
+    production[ramp] = capacity[ramp] * fraction**3
+    return production
+
+
+def _wind_power(
+    u100: np.ndarray,
+    v100: np.ndarray,
+    capacity: np.ndarray | float,
+    sp: np.ndarray | None = None,
+    t2: np.ndarray | None = None,
+) -> np.ndarray:
+    """Evaluate the full wind production model on raw arrays."""
+    # Simple power curve approximation
+    # Cut-in speed: 3 m/s
+    # Rated speed: 12 m/s
+    # Cut-out speed: 25 m/s
+    production = _wind_power_curve(np.hypot(u100, v100), capacity)
+
+    # Air density correction if pressure and temperature are provided
+    if sp is not None and t2 is not None:
+        # Standard air density at sea level and 15°C
+        rho_standard = 1.225  # kg/m³
+        # Calculate actual air density using ideal gas law
+        R_specific = 287.05  # J/(kg·K) for dry air
+        rho_actual = sp / (R_specific * t2)
+        # Apply density correction (power proportional to air density)
+        production = production * (rho_actual / rho_standard)
+
+    return production
 
 
 def calculate_wind_production(
@@ -177,46 +405,12 @@ def calculate_wind_production(
     Returns:
     - Wind power production in MW
     """
-    # Calculate wind speed
-    wind_speed = calculate_wind_speed(u100, v100)
-
-    # Simple power curve approximation
-    # Cut-in speed: 3 m/s
-    # Rated speed: 12 m/s
-    # Cut-out speed: 25 m/s
-
-    production = xr.zeros_like(wind_speed)
-
-    # Below cut-in
-    production = xr.where(wind_speed < 3, 0, production)
-
-    # Between cut-in and rated (cubic relationship)
-    cubic_region = (wind_speed >= 3) & (wind_speed < 12)
-    production = xr.where(
-        cubic_region,
-        turbine_capacity_mw * ((wind_speed - 3) / (12 - 3)) ** 3,
-        production,
-    )
-
-    # Between rated and cut-out (constant at rated power)
-    rated_region = (wind_speed >= 12) & (wind_speed < 25)
-    production = xr.where(rated_region, turbine_capacity_mw, production)
-
-    # Above cut-out
-    production = xr.where(wind_speed >= 25, 0, production)
-
-    # Air density correction if pressure and temperature are provided
+    # Wind speed, power curve and density correction run as one kernel per chunk
+    inputs = [u100, v100, turbine_capacity_mw]
     if sp is not None and t2 is not None:
-        # Standard air density at sea level and 15°C
-        rho_standard = 1.225  # kg/m³
-        # Calculate actual air density using ideal gas law
-        R_specific = 287.05  # J/(kg·K) for dry air
-        rho_actual = sp / (R_specific * t2)
-        # Apply density correction (power proportional to air density)
-        density_correction = rho_actual / rho_standard
-        production = production * density_correction
+        inputs += [sp, t2]
 
-    return production
+    return xr.apply_ufunc(_wind_power, *inputs, dask="parallelized")
 
 
 # Calculate hourly solar and wind production for the dataset
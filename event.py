@@ -95,7 +95,7 @@ def _(mo):
 def _(repo, xr):
     session = repo.readonly_session("main")
 
-    era5 = xr.open_zarr(session.store, group="temporal")
+    era5 = xr.open_zarr(session.store, group="temporal", consolidated=False)
     print(f"Size: {era5.nbytes / 1e12:.2f} TB")
     era5
     return (era5,)
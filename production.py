@@ -32,34 +32,55 @@ def _(mo):
 
 @app.cell
 def _():
+    import hashlib
+    from pathlib import Path
+
+    import dask
+    import numpy as np
     import pandas as pd
     import xarray as xr
     from arraylake import Client
     from dask.diagnostics import ProgressBar
+    from flox.xarray import xarray_reduce
     import marimo as mo
 
+    xr.set_options(use_flox=True)
+
     from energy import (
         CLIMATE_EPOCH,
         TEXAS_BBOX,
         TEXAS_METROS,
+        cached_dataset,
         calculate_renewable_production,
         calculate_solar_production,
         calculate_wind_production,
+        nearest_grid_indexers,
+        rolling_mean,
+        to_daily,
     )
     from plot import plot_climatology, plot_generator_map, plot_map
     return (
         CLIMATE_EPOCH,
         Client,
+        Path,
         ProgressBar,
         TEXAS_BBOX,
+        cached_dataset,
         calculate_renewable_production,
         calculate_solar_production,
         calculate_wind_production,
+        dask,
+        hashlib,
         mo,
+        nearest_grid_indexers,
+        np,
         pd,
         plot_climatology,
         plot_generator_map,
         plot_map,
+        rolling_mean,
+        to_daily,
+        xarray_reduce,
         xr,
     )
 
@@ -100,7 +121,14 @@ def _(client):
 def _(repo, xr):
     session = repo.readonly_session("main")
 
-    era5 = xr.open_zarr(session.store, group="temporal")
+    era5 = xr.open_zarr(
+        session.store,
+        group="temporal",
+        consolidated=False,
+        chunks={"time": "auto"},
+    )
+    # keep only the inputs to the production models, in single precision
+    era5 = era5[["t2", "sp", "ssrd", "u100", "v100"]].astype("float32", copy=False)
     era5
     return (era5,)
 
@@ -138,16 +166,29 @@ def _(calculate_solar_production, calculate_wind_production, mo):
 
 
 @app.cell
-def _(calculate_renewable_production, era5):
-    power_hour = calculate_renewable_production(era5)
+def _(TEXAS_BBOX, calculate_renewable_production, era5):
+    # subset to Texas first so the production models only run over the region
+    power_hour = calculate_renewable_production(era5.sel(**TEXAS_BBOX))
     power_hour
     return (power_hour,)
 
 
 @app.cell
-def _(ProgressBar, TEXAS_BBOX, power_hour):
+def _(ProgressBar, TEXAS_BBOX, calculate_wind_production, era5):
+    # build a wind-only graph over just 2024 rather than reducing the full power_hour
+    era5_2024 = era5.sel(time="2024", **TEXAS_BBOX)
     with ProgressBar():
-        power_map = power_hour.wind_production.sel(time='2024', **TEXAS_BBOX).mean(dim='time').load()
+        power_map = (
+            calculate_wind_production(
+                era5_2024["u100"],
+                era5_2024["v100"],
+                sp=era5_2024["sp"],
+                t2=era5_2024["t2"],
+                turbine_capacity_mw=2.0,
+            )
+            .mean(dim="time")
+            .load()
+        )
     return (power_map,)
 
 
@@ -164,13 +205,16 @@ def _(mo):
 
 
 @app.cell
-def _(power_hour):
+def _(calculate_solar_production, era5, to_daily):
     lat = 32.2
     lon = 258.6
 
-    power_hour["solar_production"].sel(
-        latitude=lat, longitude=lon, method="nearest"
-    ).sel(time=slice("2021-01-15", "2021-02-28")).resample(time="1D").mean().plot()
+    # select the point from ERA5 first so the model only runs on this time series
+    point = era5.sel(latitude=lat, longitude=lon, method="nearest").sel(
+        time=slice("2021-01-15", "2021-02-28")
+    )
+    point_solar = calculate_solar_production(point["ssrd"], point["t2"])
+    to_daily(point_solar, "mean").plot()
     return
 
 
@@ -187,28 +231,55 @@ def _(mo):
 
 
 @app.cell
-def _(pd):
-    all_generators = pd.read_excel("./data/january_generator2021.xlsx", header=2)
+def _(Path, hashlib, pd):
+    # Parsing the spreadsheet is slow, so keep only the columns we use and cache
+    # the parsed table locally for subsequent runs. The cache is named after the
+    # column selection and is refreshed whenever the spreadsheet is newer.
+    generators_xlsx = Path("./data/january_generator2021.xlsx")
+    generators_columns = [
+        "Plant Name",
+        "Entity ID",
+        "Plant State",
+        "Technology",
+        "Nameplate Capacity (MW)",
+        "Latitude",
+        "Longitude",
+        "Operating Year",
+        "Operating Month",
+    ]
+    columns_key = hashlib.sha1("\n".join(generators_columns).encode()).hexdigest()[:12]
+    generators_cache = Path(f"cache/january_generator2021_{columns_key}.pkl")
+    if (
+        generators_cache.exists()
+        and generators_cache.stat().st_mtime >= generators_xlsx.stat().st_mtime
+    ):
+        all_generators = pd.read_pickle(generators_cache)
+    else:
+        all_generators = pd.read_excel(
+            generators_xlsx, header=2, usecols=generators_columns
+        )
+        generators_cache.parent.mkdir(parents=True, exist_ok=True)
+        all_generators.to_pickle(generators_cache)
     all_generators
     return (all_generators,)
 
 
-@app.cell(hide_code=True)
-def _(mo):
-    mo.md(r"""### Extract active solar facilities""")
-    return
-
-
 @app.cell
 def _(all_generators):
-    solar_generators = all_generators[
+    # Texas generators already operating before Winter Storm Uri (February 2021),
+    # filtered in a single pass and shared by the solar and wind selections
+    operating_year = all_generators["Operating Year"]
+    active_tx_generators = all_generators[
         (all_generators["Plant State"] == "TX")
-        & (all_generators["Technology"] == "Solar Photovoltaic")
-        & (all_generators["Operating Year"] <= 2021)
+        & (
+            (operating_year < 2021)
+            | ((operating_year == 2021) & (all_generators["Operating Month"] <= 2))
+        )
     ][
         [
             "Plant Name",
             "Entity ID",
+            "Technology",
             "Nameplate Capacity (MW)",
             "Latitude",
             "Longitude",
@@ -216,13 +287,20 @@ def _(all_generators):
             "Operating Month",
         ]
     ]
-    active_solar_generators = solar_generators[
-        (solar_generators["Operating Year"] < 2021)
-        | (
-            (solar_generators["Operating Year"] == 2021)
-            & (solar_generators["Operating Month"] <= 2)
-        )
-    ]
+    return (active_tx_generators,)
+
+
+@app.cell(hide_code=True)
+def _(mo):
+    mo.md(r"""### Extract active solar facilities""")
+    return
+
+
+@app.cell
+def _(active_tx_generators):
+    active_solar_generators = active_tx_generators[
+        active_tx_generators["Technology"] == "Solar Photovoltaic"
+    ].drop(columns="Technology")
 
     active_solar_generators
     return (active_solar_generators,)
@@ -241,30 +319,10 @@ def _(mo):
 
 
 @app.cell
-def _(all_generators):
-    wind_generators = all_generators[
-        (all_generators["Plant State"] == "TX")
-        & (all_generators["Technology"].str.contains("Wind", case=False, na=False))
-        & (all_generators["Operating Year"] <= 2021)
-    ][
-        [
-            "Plant Name",
-            "Entity ID",
-            "Nameplate Capacity (MW)",
-            "Latitude",
-            "Longitude",
-            "Operating Year",
-            "Operating Month",
-        ]
-    ]
-
-    active_wind_generators = wind_generators[
-        (wind_generators["Operating Year"] < 2021)
-        | (
-            (wind_generators["Operating Year"] == 2021)
-            & (wind_generators["Operating Month"] <= 2)
-        )
-    ]
+def _(active_tx_generators):
+    active_wind_generators = active_tx_generators[
+        active_tx_generators["Technology"].str.contains("Wind", case=False, na=False)
+    ].drop(columns="Technology")
 
     active_wind_generators
     return (active_wind_generators,)
@@ -282,34 +340,69 @@ def _(mo):
         r"""
     ## Extract ERA5 data for all generator sites
 
-    We need to join the EIA generator table with the ERA5 Xarray dataset. We do that here using Xarray's vectorized indexing:
+    We need to join the EIA generator table with the ERA5 Xarray dataset. We do that here using Xarray's vectorized indexing, gathering only the variables each model needs at its own sites:
     """
     )
     return
 
 
 @app.cell
-def _(active_wind_generators, era5):
-    wind_sites_ds = active_wind_generators.to_xarray().rename({"index": "site"})
-    era5_by_wind_sites = era5.sel(
-        longitude=wind_sites_ds.Longitude,
-        latitude=wind_sites_ds.Latitude,
-        method="nearest",
+def _(
+    active_solar_generators,
+    active_wind_generators,
+    era5,
+    hashlib,
+    nearest_grid_indexers,
+    pd,
+    xr,
+):
+    def _gather_sites(generators, variables):
+        site_indexers = nearest_grid_indexers(
+            era5,
+            latitude=xr.DataArray(generators["Latitude"].to_numpy(), dims="site"),
+            longitude=xr.DataArray(generators["Longitude"].to_numpy(), dims="site"),
+        )
+        # batch sites into long contiguous time columns for the per-site models
+        by_sites = (
+            era5[variables].isel(site_indexers).chunk({"time": "auto", "site": 32})
+        )
+        by_sites["capacity"] = (
+            "site",
+            generators["Nameplate Capacity (MW)"].to_numpy(dtype="float32"),
+        )
+        return by_sites
+
+    # only gather the variables each model needs at its own sites
+    era5_by_wind_sites = _gather_sites(
+        active_wind_generators, ["u100", "v100", "sp", "t2"]
     )
-    era5_by_wind_sites["capacity"] = wind_sites_ds["Nameplate Capacity (MW)"]
+    era5_by_solar_sites = _gather_sites(active_solar_generators, ["ssrd", "t2"])
+
+    # fingerprint the site tables so cached aggregates follow changes to the fleet
+    _site_columns = ["Latitude", "Longitude", "Nameplate Capacity (MW)"]
+    _sites_hash = hashlib.sha1()
+    for _generators in (active_wind_generators, active_solar_generators):
+        _sites_hash.update(
+            pd.util.hash_pandas_object(
+                _generators[_site_columns], index=False
+            ).to_numpy()
+        )
+        # separate the two tables so sites cannot move between them unnoticed
+        _sites_hash.update(b"|")
+    sites_fingerprint = _sites_hash.hexdigest()[:12]
     era5_by_wind_sites
-    return (era5_by_wind_sites,)
+    return era5_by_solar_sites, era5_by_wind_sites, sites_fingerprint
 
 
 @app.cell(hide_code=True)
 def _(mo):
     mo.md(
         r"""
-    ## Calculate the per-site wind production
+    ## Calculate the per-site production
 
     Now that we have the ERA5 data extracted per site, we can run the production models again, this time scaling the outputs based on the nameplace capacity of each site.
 
-    First we calculate the hourly production at each site:
+    First we define the hourly production at each site. This stays lazy: only its daily total is ever materialized.
     """
     )
     return
@@ -323,11 +416,24 @@ def _(calculate_wind_production, era5_by_wind_sites):
         sp=era5_by_wind_sites["sp"],
         t2=era5_by_wind_sites["t2"],
         turbine_capacity_mw=era5_by_wind_sites["capacity"],
-    ).load()
+    )
     wind_production
     return (wind_production,)
 
 
+@app.cell
+def _(calculate_solar_production, era5_by_solar_sites):
+    solar_production = calculate_solar_production(
+        era5_by_solar_sites["ssrd"],
+        era5_by_solar_sites["t2"],
+        panel_capacity_mw=era5_by_solar_sites["capacity"],
+        efficiency_ref=0.20,
+        temp_coeff=-0.004,
+    )
+    solar_production
+    return (solar_production,)
+
+
 @app.cell(hide_code=True)
 def _(mo):
     mo.md(r"""Then we calculate the climatology for total production across all sites:""")
@@ -335,18 +441,71 @@ def _(mo):
 
 
 @app.cell
-def _(CLIMATE_EPOCH, wind_production):
-    # sum across sites and resample to daily frequency
-    wind_production_daily = wind_production.sum("site").resample(time="1d").mean()
+def _(
+    CLIMATE_EPOCH,
+    ProgressBar,
+    cached_dataset,
+    dask,
+    np,
+    sites_fingerprint,
+    solar_production,
+    to_daily,
+    wind_production,
+    xarray_reduce,
+    xr,
+):
+    def _compute_production_daily():
+        # average to daily frequency and sum across sites (the two reductions commute).
+        # Computing wind and solar together lets dask read the ERA5 chunks they share
+        # once, streaming the hourly per-site production chunk by chunk
+        with ProgressBar():
+            wind_daily, solar_daily = dask.compute(
+                to_daily(wind_production, "mean").sum("site"),
+                to_daily(solar_production, "mean").sum("site"),
+            )
+        daily = xr.Dataset({"wind": wind_daily, "solar": solar_daily})
+
+        # calculate both climatologies with one flox reduction per statistic,
+        # decoding the day-of-year labels once for both variables
+        climate = daily.sel(time=CLIMATE_EPOCH)
+        climate = climate.assign_coords(dayofyear=climate.time.dt.dayofyear)
+        days_of_year = np.arange(1, 367)
+        climatology_mean, climatology_std = (
+            xarray_reduce(climate, "dayofyear", func=stat, expected_groups=days_of_year)
+            for stat in ("mean", "std")
+        )
+        return xr.Dataset(
+            {
+                "wind_daily": daily["wind"],
+                "wind_climatology_mean": climatology_mean["wind"],
+                "wind_climatology_std": climatology_std["wind"],
+                "solar_daily": daily["solar"],
+                "solar_climatology_mean": climatology_mean["solar"],
+                "solar_climatology_std": climatology_std["solar"],
+            }
+        )
 
-    # calculate the climatology
-    wind_climatology_mean = (
-        wind_production_daily.sel(time=CLIMATE_EPOCH).groupby("time.dayofyear").mean(dim="time")
+    # the daily aggregates only depend on the epoch and the sites, so reuse them
+    # across runs
+    production_daily = cached_dataset(
+        f"cache/renewable_production_{CLIMATE_EPOCH.start}_{CLIMATE_EPOCH.stop}"
+        f"_{sites_fingerprint}.zarr",
+        _compute_production_daily,
     )
-    wind_climatology_std = (
-        wind_production_daily.sel(time=CLIMATE_EPOCH).groupby("time.dayofyear").std(dim="time")
+    wind_production_daily = production_daily["wind_daily"]
+    wind_climatology_mean = production_daily["wind_climatology_mean"]
+    wind_climatology_std = production_daily["wind_climatology_std"]
+    solar_production_daily = production_daily["solar_daily"]
+    solar_climatology_mean = production_daily["solar_climatology_mean"]
+    solar_climatology_std = production_daily["solar_climatology_std"]
+    return (
+        solar_climatology_mean,
+        solar_climatology_std,
+        solar_production_daily,
+        wind_climatology_mean,
+        wind_climatology_std,
+        wind_production_daily,
     )
-    return wind_climatology_mean, wind_climatology_std, wind_production_daily
 
 
 @app.cell(hide_code=True)
@@ -364,23 +523,18 @@ def _(mo):
 @app.cell
 def _(
     plot_climatology,
+    rolling_mean,
     wind_climatology_mean,
     wind_climatology_std,
     wind_production_daily,
 ):
     smooth_factor = 4
 
-    smooth_wind_mean = wind_climatology_mean.rolling(
-        dayofyear=smooth_factor
-    ).mean()
-    smooth_wind_std = wind_climatology_std.rolling(
-        dayofyear=smooth_factor
-    ).mean()
-
-    smooth_wind_actual = (
-        wind_production_daily.rolling(time=smooth_factor)
-        .mean()
-        .sel(time=slice("2021-01-01", "2021-12-31"))
+    smooth_wind_mean = rolling_mean(wind_climatology_mean, "dayofyear", smooth_factor)
+    smooth_wind_std = rolling_mean(wind_climatology_std, "dayofyear", smooth_factor)
+
+    smooth_wind_actual = rolling_mean(wind_production_daily, "time", smooth_factor).sel(
+        time=slice("2021-01-01", "2021-12-31")
     )
     smooth_wind_actual.coords["dayofyear"] = smooth_wind_actual["time.dayofyear"]
 
@@ -400,63 +554,20 @@ def _(mo):
     return
 
 
-@app.cell
-def _(active_solar_generators, calculate_solar_production, era5):
-    solar_sites_ds = active_solar_generators.to_xarray().rename({"index": "site"})
-    era5_by_solar_sites = era5.sel(
-        longitude=solar_sites_ds.Longitude,
-        latitude=solar_sites_ds.Latitude,
-        method="nearest",
-    )
-    era5_by_solar_sites["capacity"] = solar_sites_ds["Nameplate Capacity (MW)"]
-
-    solar_production = calculate_solar_production(
-        era5_by_solar_sites["ssrd"],
-        era5_by_solar_sites["t2"],
-        panel_capacity_mw=era5_by_solar_sites["capacity"],
-        efficiency_ref=0.20,
-        temp_coeff=-0.004,
-    ).load()
-    solar_production
-    return (solar_production,)
-
-
-@app.cell
-def _(CLIMATE_EPOCH, solar_production):
-    solar_production_daily = solar_production.sum("site").resample(time="1d").mean()
-
-    solar_climatology_mean = (
-        solar_production_daily.sel(time=CLIMATE_EPOCH)
-        .groupby("time.dayofyear")
-        .mean(dim="time")
-    )
-    solar_climatology_std = (
-        solar_production_daily.sel(time=CLIMATE_EPOCH).groupby("time.dayofyear").std(dim="time")
-    )
-    return (
-        solar_climatology_mean,
-        solar_climatology_std,
-        solar_production_daily,
-    )
-
-
 @app.cell
 def _(
     plot_climatology,
+    rolling_mean,
     smooth_factor,
     solar_climatology_mean,
     solar_climatology_std,
     solar_production_daily,
 ):
-    smooth_solar_mean = solar_climatology_mean.rolling(
-        dayofyear=smooth_factor,
-    ).mean()
-    smooth_solar_std = solar_climatology_std.rolling(dayofyear=smooth_factor).mean()
-    smooth_solar_actual = (
-        solar_production_daily.rolling(time=smooth_factor)
-        .mean()
-        .sel(time=slice("2021-01-01", "2021-12-31"))
-    )
+    smooth_solar_mean = rolling_mean(solar_climatology_mean, "dayofyear", smooth_factor)
+    smooth_solar_std = rolling_mean(solar_climatology_std, "dayofyear", smooth_factor)
+    smooth_solar_actual = rolling_mean(
+        solar_production_daily, "time", smooth_factor
+    ).sel(time=slice("2021-01-01", "2021-12-31"))
     smooth_solar_actual.coords["dayofyear"] = smooth_solar_actual["time.dayofyear"]
 
     plot_climatology(